@@ -1,14 +1,34 @@
 import os
 import io
+import math
+import sys
 import json
 import time
+import random
 import base64
+import asyncio
+import functools
+import itertools
+import threading
+import contextlib
+import collections
+import argparse
+import tempfile
+import subprocess
+import statistics
+import tracemalloc
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
 
 import simplekml
 import numpy as np
 
 from PIL import Image
 from time import sleep
+from abc import ABC, abstractmethod
 from enum import Enum, auto
 
 from selenium import webdriver
@@ -17,17 +37,161 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.by import By
 
+from rich.style import Style
+from rich.segment import Segment
+
 from textual.app import App
 from textual.widgets import Button, Static, Input, Label, Checkbox, Switch
 from textual.containers import Vertical, Horizontal
 from textual.reactive import reactive
+from textual.scroll_view import ScrollView
+from textual.geometry import Size
+from textual.strip import Strip
 
 
 def color_manhattan(c1, c2):
-    return np.sum(abs(c1[i] - c2[i]) for i in range(3))
+    return sum(abs(int(c1[i]) - int(c2[i])) for i in range(3))
 
 
-class NautilusPilot:
+class Tracer:
+    """
+    Span timings of the hot paths, kept in a ring buffer of the last
+    capacity spans. A disabled tracer hands out one shared do-nothing
+    span, so the instrumentation can stay in place at next to no cost.
+    """
+
+    NULL_SPAN = contextlib.nullcontext()
+
+    class Span:
+        __slots__ = ("tracer", "name", "begin")
+
+        def __init__(self, tracer, name):
+            self.tracer = tracer
+            self.name = name
+
+        def __enter__(self):
+            self.begin = time.perf_counter_ns()
+
+        def __exit__(self, *exc_info):
+            end = time.perf_counter_ns()
+            self.tracer.spans.append(
+                (self.name, self.begin, end - self.begin, threading.get_ident())
+            )
+
+    def __init__(self, enabled=False, capacity=4096):
+        self.enabled = enabled
+        self.spans = collections.deque(maxlen=capacity)
+
+    def span(self, name):
+        if not self.enabled:
+            return Tracer.NULL_SPAN
+        return Tracer.Span(self, name)
+
+    def percentiles(self):
+        """
+        Return {name: (count, p50 ms, p95 ms)} over the buffered spans.
+        """
+        durations = collections.defaultdict(list)
+        for name, _, duration, _ in list(self.spans):
+            durations[name].append(duration / 1e6)
+
+        stats = {}
+        for name, values in durations.items():
+            values.sort()
+            p50 = values[(len(values) - 1) // 2]
+            p95 = values[int(round((len(values) - 1) * 0.95))]
+            stats[name] = (len(values), p50, p95)
+        return stats
+
+    def export_chrome_trace(self, path):
+        """
+        Save the buffered spans as a Chrome trace (chrome://tracing, Perfetto).
+        """
+        events = [
+            {
+                "name": name,
+                "ph": "X",
+                "ts": begin / 1e3,
+                "dur": duration / 1e3,
+                "pid": os.getpid(),
+                "tid": thread,
+            }
+            for name, begin, duration, thread in list(self.spans)
+        ]
+
+        with open(path, "w") as trace_file:
+            json.dump({"traceEvents": events}, trace_file)
+
+
+def traced(name):
+    """
+    Run the decorated method inside a span of self.tracer.
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.tracer.span(name):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class PilotBackend(ABC):
+    """
+    Everything NautilusPilot needs from the thing that shows the map.
+
+    start/stop open and close it, screenshot returns an RGB(A) array,
+    canvas_size returns (height, width) in canvas pixels, dismiss closes
+    whatever the previous upload left open, drop uploads a base64 encoded
+    file, settle waits for the upload to be picked up and click clicks at
+    an offset from the canvas center.
+    """
+
+    @abstractmethod
+    def is_online(self):
+        pass
+
+    @abstractmethod
+    def start(self):
+        pass
+
+    @abstractmethod
+    def stop(self):
+        pass
+
+    @abstractmethod
+    def screenshot(self):
+        pass
+
+    @abstractmethod
+    def canvas_size(self):
+        pass
+
+    @abstractmethod
+    def dismiss(self):
+        pass
+
+    @abstractmethod
+    def drop(self, b64_content, filename):
+        pass
+
+    @abstractmethod
+    def settle(self):
+        pass
+
+    @abstractmethod
+    def click(self, col_offset, row_offset):
+        pass
+
+
+class EarthBackend(PilotBackend):
+    """
+    Google Earth in a live Edge, driven by Selenium.
+    """
+
     JS_DRAG_AND_DROP = """
         var b64File = '{}';
         var filename = '{}';
@@ -57,36 +221,341 @@ class NautilusPilot:
         }});
     """
 
+    SETTLE_SECONDS = 0.3
+
+    def __init__(self):
+        self.driver = None
+        self.canvas = None
+
+    def is_online(self):
+        return self.driver is not None and self.canvas is not None
+
+    def start(self):
+        local_user_data_folder = os.path.join(os.getcwd(), "Local")
+        if not os.path.exists(local_user_data_folder):
+            os.makedirs(local_user_data_folder)
+
+        options = webdriver.EdgeOptions()
+        options.add_argument(f"user-data-dir={local_user_data_folder}")
+        options.add_argument("--disable-infobars")
+
+        service = Service("msedgedriver.exe")
+
+        self.driver = webdriver.Edge(service=service, options=options)
+        self.driver.get("https://earth.google.com/web")
+
+        sleep(3)
+        WebDriverWait(self.driver, 30).until(
+            lambda driver: driver.current_url.find("@") != -1
+        )
+
+        self.canvas = self.driver.find_element(By.ID, "earth-canvas")
+        # self.canvas.click()
+
+    def stop(self):
+        self.driver.quit()
+        self.driver = None
+        self.canvas = None
+
+    def screenshot(self):
+        image_data = self.driver.get_screenshot_as_png()
+        image = Image.open(io.BytesIO(image_data))
+        # image.save("screenshot.png")
+        image = np.array(image)
+
+        return image
+
+    def canvas_size(self):
+        return self.canvas.size["height"], self.canvas.size["width"]
+
+    def dismiss(self):
+        ActionChains(self.driver).send_keys("\ue00c").perform()
+        ActionChains(self.driver).send_keys("\ue00c").perform()
+        ActionChains(self.driver).send_keys("\ue00c").perform()
+
+    def drop(self, b64_content, filename):
+        self.driver.execute_script(
+            EarthBackend.JS_DRAG_AND_DROP.format(b64_content, filename),
+            self.canvas,
+        )
+
+    def settle(self):
+        sleep(EarthBackend.SETTLE_SECONDS)
+
+    def click(self, col_offset, row_offset):
+        ActionChains(self.driver).move_to_element_with_offset(
+            self.canvas, col_offset, row_offset
+        ).click().perform()
+
+
+class CanvasBackend(PilotBackend):
+    """
+    In-process stand-in for Google Earth, for benchmarks and offline runs.
+    Uploads and clicks are recorded instead of rendered, and screenshots are
+    synthetic but carry the gray bar and the KML icon find_kml_profile
+    looks for. pixel_ratio > 1 mimics a HiDPI screen, where the screenshot
+    is larger than the canvas.
+    """
+
+    BACKGROUND_COLOR = (16, 38, 64)
+    GRAY_BAR_COLOR = (225, 227, 225)
+    WHITE_COLOR = (255, 255, 255)
+    KML_ICON_COLOR = (68, 71, 70)
+
+    def __init__(self, width=1280, height=720, pixel_ratio=1):
+        self.width = width
+        self.height = height
+        self.pixel_ratio = pixel_ratio
+
+        self.online = False
+        self.uploads = []
+        self.clicks = []
+        self.dismissals = 0
+
+        # (top, left, bottom, right) of the KML icon, in canvas pixels
+        self.kml_icon_box = None
+
+    def is_online(self):
+        return self.online
+
+    def start(self):
+        self.online = True
+
+    def stop(self):
+        self.online = False
+
+    def screenshot(self):
+        height = self.height * self.pixel_ratio
+        width = self.width * self.pixel_ratio
+
+        image = np.empty((height, width, 3), dtype=np.uint8)
+        image[:, :] = CanvasBackend.BACKGROUND_COLOR
+
+        # white side panel left of the center, gray bar on top of the rest
+        bar_top = height // 10
+        bar_height = max(4, height // 20)
+        panel_left = width // 20
+        panel_right = width // 4
+        image[bar_top:, panel_left:panel_right] = CanvasBackend.WHITE_COLOR
+        image[bar_top : bar_top + bar_height, panel_right:] = (
+            CanvasBackend.GRAY_BAR_COLOR
+        )
+
+        # icon on the down-right diagonal from the corner of the panel
+        icon_size = max(8, width // 80) // 2 * 2
+        icon_top = bar_top + icon_size
+        icon_left = panel_right + icon_size
+        image[icon_top : icon_top + icon_size, icon_left : icon_left + icon_size] = (
+            CanvasBackend.KML_ICON_COLOR
+        )
+
+        self.kml_icon_box = (
+            icon_top // self.pixel_ratio,
+            icon_left // self.pixel_ratio,
+            (icon_top + icon_size) // self.pixel_ratio,
+            (icon_left + icon_size) // self.pixel_ratio,
+        )
+
+        return image
+
+    def canvas_size(self):
+        return self.height, self.width
+
+    def dismiss(self):
+        self.dismissals += 1
+
+    def drop(self, b64_content, filename):
+        self.uploads.append(
+            {
+                "filename": filename,
+                "payload_bytes": len(b64_content),
+                "content": base64.b64decode(b64_content),
+            }
+        )
+
+    def settle(self):
+        pass
+
+    def click(self, col_offset, row_offset):
+        col = self.width // 2 + col_offset
+        row = self.height // 2 + row_offset
+
+        hit = False
+        if self.kml_icon_box is not None:
+            top, left, bottom, right = self.kml_icon_box
+            hit = top - 1 <= row <= bottom and left - 1 <= col <= right
+
+        self.clicks.append((col, row, hit))
+
+
+class StyleRegistry:
+    """
+    One shared simplekml Style per distinct look. simplekml writes a shared
+    style once at the top of the document and features point at it with
+    styleUrl, instead of every feature carrying a Style block of its own.
+    """
+
+    def __init__(self):
+        self.styles = {}
+
+    def line_style(self, color, width):
+        key = ("line", color, width)
+        if key not in self.styles:
+            style = simplekml.Style()
+            style.linestyle.color = color
+            style.linestyle.width = width
+            self.styles[key] = style
+        return self.styles[key]
+
+    def icon_style(self, color):
+        key = ("icon", color)
+        if key not in self.styles:
+            style = simplekml.Style()
+            style.iconstyle.color = color
+            self.styles[key] = style
+        return self.styles[key]
+
+
+class NautilusPilot:
     JSON_PATH = "data.json"
 
     KML_PATH = "data.kml"
 
-    def update_kml(self):
-        with open(NautilusPilot.JSON_PATH, "r") as json_file:
-            json_data = json.load(json_file)
+    TRACE_PATH = "trace.json"
+
+    HISTORY_LENGTH = 1000
+
+    # routes without their own "color"/"width" in data.json, color is aabbggrr
+    ROUTE_COLOR = "FFFEE7A6"
+    ROUTE_WIDTH = 4
 
-        kml = simplekml.Kml()
+    # journal lines kept before the journal is started over
+    JOURNAL_LENGTH = 10000
 
-        # points
+    @traced("update_kml")
+    def update_kml(self, json_data=None):
+        """
+        Rebuild data.kml from the store. Callers already holding the store
+        lock pass the data they synced, everyone else leaves it to us.
+        """
+        if json_data is None:
+            with self.store_lock():
+                self.save_kml(self.sync())
+        else:
+            self.save_kml(json_data)
+
+    @traced("patch_kml")
+    def patch_kml(self, json_data, edit, inverse=False):
+        """
+        Apply one edit, already applied to json_data, to the KML document
+        kept from the last save and save it again, instead of building the
+        whole document. Only valid if that document was built from the data
+        as it was before the edit. Call with the store locked.
+        """
+        kind, route_name, _, index, point = edit[:5]
+        insert = (kind == "add") != inverse
+
+        # simplekml has no API to insert or remove features, pins come first
+        # in its list, in the order of data.json, followed by one line per route
+        features = self.kml.document._features
+        self.kml_state = None
+
+        with self.tracer.span("kml.patch"):
+            if route_name == "":
+                if insert:
+                    self.new_pin(point)
+                    features.insert(index, features.pop())
+                else:
+                    features.pop(index)
+            else:
+                route = self.get_route(json_data, route_name)
+                names = [line.name for line in self.kml_lines]
+                offset = len(json_data["points"])
+
+                if route is None:
+                    # the edit dropped the route
+                    line_index = names.index(route_name)
+                    features.pop(offset + line_index)
+                    self.kml_lines.pop(line_index)
+                elif route_name not in names:
+                    # the edit brought the route back
+                    line_index = json_data["routes"].index(route)
+                    self.kml_lines.insert(line_index, self.new_line(route))
+                    features.insert(offset + line_index, features.pop())
+                else:
+                    line = self.kml_lines[names.index(route_name)]
+                    line.coords = [
+                        (point["longitude"], point["latitude"])
+                        for point in route["points"]
+                    ]
+
+        self.write_kml()
+
+    def save_kml(self, json_data):
+        # built and saved with the store locked, so the last data.kml on disk
+        # always comes from the latest data, and replaced in one go so that
+        # nobody uploads half of it
+        self.kml_state = None
+        with self.tracer.span("kml.build"):
+            self.build_kml(json_data)
+
+        self.write_kml()
+
+    def write_kml(self):
+        with self.tracer.span("kml.save"):
+            temp_path = f"{self.kml_path}.{os.getpid()}.tmp"
+            # no pretty printing, the indentation alone is a fifth of the file
+            self.kml.save(temp_path, format=False)
+            for attempt in range(20):
+                try:
+                    os.replace(temp_path, self.kml_path)
+                    break
+                except PermissionError:
+                    # Windows refuses while another process reads data.kml
+                    sleep(0.05)
+            else:
+                os.remove(temp_path)
+                raise PermissionError(f"{self.kml_path} stays locked")
+
+        # the document is kept, so that undo and redo can patch it
+        self.kml_state = self.store_state
+
+    def build_kml(self, json_data):
+        self.kml = simplekml.Kml()
+        self.kml_styles = StyleRegistry()
+
+        # points, optionally colored by their own "color"
         for point in json_data["points"]:
-            kml.newpoint(
-                name=point["name"],
-                coords=[(point["longitude"], point["latitude"])],
-            )
+            self.new_pin(point)
 
         # routes
-        for route in json_data["routes"]:
-            line = kml.newlinestring(
-                name=route["name"],
-                coords=[
-                    (point["longitude"], point["latitude"]) for point in route["points"]
-                ],
-            )
+        self.kml_lines = [self.new_line(route) for route in json_data["routes"]]
 
-            line.style.linestyle.color = "FFFEE7A6"
-            line.style.linestyle.width = 4
+        return self.kml
+
+    def new_pin(self, point):
+        pin = self.kml.newpoint(
+            name=point["name"],
+            coords=[(point["longitude"], point["latitude"])],
+        )
+
+        if "color" in point:
+            pin.style = self.kml_styles.icon_style(point["color"])
+        return pin
+
+    def new_line(self, route):
+        line = self.kml.newlinestring(
+            name=route["name"],
+            coords=[
+                (point["longitude"], point["latitude"]) for point in route["points"]
+            ],
+        )
 
-        kml.save(NautilusPilot.KML_PATH)
+        line.style = self.kml_styles.line_style(
+            route.get("color", NautilusPilot.ROUTE_COLOR),
+            route.get("width", NautilusPilot.ROUTE_WIDTH),
+        )
+        return line
 
     def get_route(self, json, route_name):
         for r in json["routes"]:
@@ -94,43 +563,363 @@ class NautilusPilot:
                 return r
         return None
 
+    ### store #################################################################################
+    # data.json is shared by every Wheelhouse and script on the machine. Writers
+    # hold store_lock for the whole read-modify-write, and append each edit to a
+    # journal next to data.json, so the other processes can catch up by replaying
+    # the journal tail instead of parsing the whole file again.
+
+    @contextlib.contextmanager
+    def store_lock(self):
+        with open(self.lock_path, "a+") as lock_file:
+            if os.name == "nt":
+                lock_file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        pass
+            else:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+
+            try:
+                yield
+            finally:
+                if os.name == "nt":
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+                else:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def store_stat(self):
+        json_mtime = os.stat(self.json_path).st_mtime_ns
+        if os.path.exists(self.journal_path):
+            journal_size = os.path.getsize(self.journal_path)
+        else:
+            journal_size = 0
+        return json_mtime, journal_size
+
+    @property
+    def store_state(self):
+        """
+        How far into the store the cached data reaches.
+        """
+        return (self.json_mtime, self.journal_offset)
+
+    def store_changed(self):
+        """
+        Cheap check, without the lock, for edits made by other processes.
+        """
+        if self.json_data is None:
+            return False
+        return self.store_stat() != (self.json_mtime, self.journal_offset)
+
+    def sync(self):
+        """
+        Bring the cached data up to date with the store and return it.
+        Edits by other processes are replayed from the journal when possible,
+        otherwise data.json is read again. Call with the store locked.
+        """
+        json_mtime, journal_size = self.store_stat()
+        if self.json_data is not None and (json_mtime, journal_size) == (
+            self.json_mtime,
+            self.journal_offset,
+        ):
+            return self.json_data
+
+        if self.json_data is not None and journal_size > self.journal_offset:
+            with self.tracer.span("journal.read"):
+                replayed = self.catch_up(json_mtime, journal_size)
+            if replayed is not None:
+                if self.history_conflicts(replayed):
+                    self.undo_stack.clear()
+                    self.redo_stack.clear()
+                return self.json_data
+
+        with self.tracer.span("json.read"):
+            with open(self.json_path, "r") as json_file:
+                self.json_data = json.load(json_file)
+
+            self.journal_seq = 0
+            if journal_size > 0:
+                with open(self.journal_path, "rb") as journal:
+                    for line in journal:
+                        pass
+                try:
+                    self.journal_seq = json.loads(line)["seq"]
+                except ValueError:
+                    pass
+
+        self.json_mtime = json_mtime
+        self.journal_offset = journal_size
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+
+        return self.json_data
+
+    def catch_up(self, json_mtime, journal_size):
+        """
+        Replay the journal lines written since our last sync and return
+        the replayed edits, None if they do not lead to the current data.json.
+        """
+        with open(self.journal_path, "rb") as journal:
+            journal.seek(self.journal_offset)
+            lines = journal.read(journal_size - self.journal_offset).splitlines()
+
+        seq = self.journal_seq
+        mtime = None
+        replayed = []
+        try:
+            for line in lines:
+                entry = json.loads(line)
+                if entry["seq"] != seq + 1:
+                    return None
+                if not self.apply_edit(
+                    self.json_data, entry["edit"], inverse=entry["inverse"]
+                ):
+                    return None
+                replayed.append(entry["edit"])
+                seq = entry["seq"]
+                mtime = entry["mtime"]
+        except (ValueError, KeyError, TypeError):
+            return None
+
+        if mtime != json_mtime:
+            # data.json was also changed by hand
+            return None
+
+        self.journal_seq = seq
+        self.json_mtime = json_mtime
+        self.journal_offset = journal_size
+        return replayed
+
+    def history_conflicts(self, edits):
+        """
+        Whether edits by other processes may have moved points our history
+        refers to: an edit on the same point list at or before the furthest
+        index in the history. Appends past it, like a streamed track, do not.
+        """
+        reach = {}
+        for edit in itertools.chain(self.undo_stack, self.redo_stack):
+            route_name, index = edit[1], edit[3]
+            reach[route_name] = max(reach.get(route_name, -1), index)
+
+        for edit in edits:
+            route_name, index = edit[1], edit[3]
+            if route_name in reach and index <= reach[route_name]:
+                return True
+        return False
+
+    def commit(self, edits, inverse=False):
+        """
+        Write the cached data back to data.json and journal the edits that
+        led to it. Call with the store locked.
+        """
+        with self.tracer.span("json.write"):
+            temp_path = self.json_path + ".tmp"
+            try:
+                with open(temp_path, "w") as json_file:
+                    json.dump(self.json_data, json_file)
+                json_mtime = os.stat(temp_path).st_mtime_ns
+                os.replace(temp_path, self.json_path)
+            except Exception:
+                # the cache holds an edit the store never got
+                self.json_data = None
+                raise
+
+        lines = []
+        for edit in edits:
+            self.journal_seq += 1
+            if self.journal_seq % NautilusPilot.JOURNAL_LENGTH == 0:
+                # start over, readers that fall behind reload data.json
+                open(self.journal_path, "wb").close()
+                lines = []
+
+            entry = {
+                "seq": self.journal_seq,
+                "edit": edit,
+                "inverse": inverse,
+                "mtime": json_mtime,
+            }
+            lines.append(json.dumps(entry) + "\n")
+
+        with self.tracer.span("journal.write"):
+            with open(self.journal_path, "ab") as journal:
+                journal.write("".join(lines).encode())
+
+        self.json_mtime, self.journal_offset = self.store_stat()
+
+    def load(self):
+        with self.store_lock():
+            return self.sync()
+
+    def reload(self):
+        """
+        Pick up edits made by other processes and rebuild the KML.
+        """
+        self.update_kml()
+
+    ###########################################################################################
+
+    @traced("add_point")
     def add_point(self, name, route_name, latitude, longitude):
         """
         If route is empty, add the point to the point list.
         If route is not empty, add the point to the route with the given name.
         New route will be created if the route does not exist.
         """
-        with open(NautilusPilot.JSON_PATH, "r") as json_file:
-            json_data = json.load(json_file)
+        with self.store_lock():
+            json_data = self.sync()
 
-        point = {"name": name, "latitude": latitude, "longitude": longitude}
+            point = {"name": name, "latitude": latitude, "longitude": longitude}
 
-        if route_name == "":
-            json_data["points"].append(point)
-        else:
-            route = self.get_route(json_data, route_name)
-            if route is None:
-                route = {"name": route_name, "points": []}
-                json_data["routes"].append(route)
+            route_index = None
+            if route_name == "":
+                points = json_data["points"]
+            else:
+                route = self.get_route(json_data, route_name)
+                if route is None:
+                    route = {"name": route_name, "points": []}
+                    json_data["routes"].append(route)
+                route_index = json_data["routes"].index(route)
+                points = route["points"]
 
-            route["points"].append(point)
+            points.append(point)
+            edit = ("add", route_name, route_index, len(points) - 1, point)
 
-        with open(NautilusPilot.JSON_PATH, "w") as json_file:
-            json.dump(json_data, json_file)
+            self.commit([edit])
+            self.record_edit(edit)
 
-        self.update_kml()
+            self.update_kml(json_data)
 
-    def remove_point(self, name, route_name):
+    @traced("remove_point")
+    def remove_point(self, name, route_name, index=None):
         """
         If route is empty, remove from the point list.
         If route is not empty, remove from the route with the given name.
         If route does not exist, return False.
 
+        If index is given, remove the point at that index if it has the name.
         If name is empty, remove the last point.
         If name is not empty, remove the last occurrence of the name.
         """
-        with open(self.JSON_PATH, "r") as json_file:
-            json_data = json.load(json_file)
+        with self.store_lock():
+            json_data = self.sync()
+
+            route = None
+            route_index = None
+            if route_name == "":
+                points = json_data["points"]
+            else:
+                route = self.get_route(json_data, route_name)
+                if route is None:
+                    return False, "No such route!"
+                route_index = json_data["routes"].index(route)
+                points = route["points"]
+
+            if index is not None:
+                # remove the exact point picked in the pin browser
+                if 0 <= index < len(points) and points[index]["name"] == name:
+                    removed = points.pop(index)
+                    success = True
+                    message = f"{name or 'Pin'} removed!"
+                else:
+                    success = False
+                    message = "No such pin!"
+            elif name == "":
+                # try to remove the last point
+                index = len(points) - 1
+                if index >= 0:
+                    removed = points.pop(index)
+                    success = True
+                    message = "Last pin removed!"
+                else:
+                    success = False
+                    message = "No pin to remove!"
+            else:
+                # remove the last occurrence
+                index = None
+                for i, point in enumerate(reversed(points)):
+                    if point["name"] == name:
+                        index = len(points) - 1 - i
+                        break
+
+                if index is None:
+                    success = False
+                    message = f"No such pin!"
+                else:
+                    removed = points.pop(index)
+                    success = True
+                    message = f"{name} removed!"
+
+            if not success:
+                return success, message
+
+            edit = ("remove", route_name, route_index, index, removed)
+
+            if route is not None:
+                if len(route["points"]) == 0:
+                    json_data["routes"].remove(route)
+
+                    # so that undo brings the route back with its color and width
+                    route_style = {
+                        key: value
+                        for key, value in route.items()
+                        if key not in ("name", "points")
+                    }
+                    if len(route_style) > 0:
+                        edit += (route_style,)
+
+            self.commit([edit])
+            self.record_edit(edit)
+
+            self.update_kml(json_data)
+
+        return success, message
+
+    @traced("append_track")
+    def append_track(self, route_name, points):
+        """
+        Append a batch of points to the route with the given name, creating
+        it if needed, in a single write. Unlike add_point it leaves data.kml
+        and the undo history alone, the Wheelhouse rebuilds the KML when it
+        picks up the change.
+        """
+        if len(points) == 0:
+            return
+
+        with self.store_lock():
+            json_data = self.sync()
+
+            route = self.get_route(json_data, route_name)
+            if route is None:
+                route = {"name": route_name, "points": []}
+                json_data["routes"].append(route)
+            route_index = json_data["routes"].index(route)
+
+            edits = []
+            for point in points:
+                route["points"].append(point)
+                edits.append(
+                    ("add", route_name, route_index, len(route["points"]) - 1, point)
+                )
+
+            self.commit(edits)
+
+    def record_edit(self, edit):
+        self.undo_stack.append(edit)
+        self.redo_stack.clear()
+
+    def apply_edit(self, json_data, edit, inverse=False):
+        """
+        Insert or remove the point of an edit at its recorded position,
+        recreating or dropping its route as needed. A removal that dropped
+        a route carries the route's other keys as a sixth field.
+        Return False if the data no longer matches the edit.
+        """
+        kind, route_name, route_index, index, point, *route_style = edit
+        insert = (kind == "add") != inverse
 
         route = None
         if route_name == "":
@@ -138,61 +927,106 @@ class NautilusPilot:
         else:
             route = self.get_route(json_data, route_name)
             if route is None:
-                return False, "No such route!"
+                if not insert:
+                    return False
+                route = {"name": route_name}
+                if len(route_style) > 0:
+                    route.update(route_style[0])
+                route["points"] = []
+                json_data["routes"].insert(route_index, route)
             points = route["points"]
 
-        if name == "":
-            # try to remove the last point
-            index = len(points) - 1
-            if index >= 0:
-                points.pop(index)
-                success = True
-                message = "Last pin removed!"
-            else:
-                success = False
-                message = "No pin to remove!"
-        if name != "":
-            # remove the last occurrence
-            index = None
-            for i, point in enumerate(reversed(points)):
-                if point["name"] == name:
-                    index = len(points) - 1 - i
-                    break
+        if insert:
+            if index > len(points):
+                return False
+            points.insert(index, point)
+        else:
+            if index >= len(points) or points[index] != point:
+                return False
+            points.pop(index)
+            if route is not None and len(points) == 0:
+                json_data["routes"].remove(route)
 
-            if index is None:
-                success = False
-                message = f"No such pin!"
-            else:
-                points.pop(index)
-                success = True
-                message = f"{name} removed!"
+        return True
 
-        if route is not None:
-            if len(route["points"]) == 0:
-                json_data["routes"].remove(route)
+    def replay(self, source, target, inverse):
+        with self.store_lock():
+            json_data = self.sync()
 
-        with open(NautilusPilot.JSON_PATH, "w") as json_file:
-            json.dump(json_data, json_file)
+            if len(source) == 0:
+                return False, "Nothing to {}!".format("undo" if inverse else "redo")
 
-        self.update_kml()
+            edit = source.pop()
+            kml_current = self.kml is not None and self.kml_state == self.store_state
+            if not self.apply_edit(json_data, edit, inverse=inverse):
+                # the data changed under us, the history no longer applies
+                self.undo_stack.clear()
+                self.redo_stack.clear()
+                self.json_data = None
+                return False, "History is out of date!"
+            target.append(edit)
 
-        return success, message
+            self.commit([edit], inverse=inverse)
 
-    def __init__(self):
-        self.driver = None
-        self.canvas = None
+            # one step only moves one pin, patch the KML instead of rebuilding it
+            if kml_current:
+                self.patch_kml(json_data, edit, inverse=inverse)
+            else:
+                self.update_kml(json_data)
+
+        kind, _, _, _, point = edit[:5]
+        verb = "removed" if (kind == "add") == inverse else "restored"
+        return True, f"{point['name'] or 'Pin'} {verb}!"
+
+    @traced("undo")
+    def undo(self):
+        """
+        Revert the last add_point or remove_point.
+        """
+        return self.replay(self.undo_stack, self.redo_stack, inverse=True)
+
+    @traced("redo")
+    def redo(self):
+        """
+        Apply the last undone edit again.
+        """
+        return self.replay(self.redo_stack, self.undo_stack, inverse=False)
+
+    def __init__(self, backend=None, json_path=None, kml_path=None, tracer=None):
+        self.backend = EarthBackend() if backend is None else backend
+        self.tracer = Tracer() if tracer is None else tracer
+
+        self.json_path = NautilusPilot.JSON_PATH if json_path is None else json_path
+        self.kml_path = NautilusPilot.KML_PATH if kml_path is None else kml_path
+        self.lock_path = self.json_path + ".lock"
+        self.journal_path = os.path.splitext(self.json_path)[0] + ".journal"
+
+        # cached copy of data.json and how far into the store it reaches
+        self.json_data = None
+        self.json_mtime = None
+        self.journal_offset = 0
+        self.journal_seq = 0
+
+        # the KML document last saved, its route lines and the store state it
+        # was built from
+        self.kml = None
+        self.kml_styles = None
+        self.kml_lines = []
+        self.kml_state = None
 
         self.kml_profile_col_offset = 0
         self.kml_profile_row_offset = 0
+        self.update_lock = threading.Lock()
 
-    def screenshot(self):
-        image_data = self.driver.get_screenshot_as_png()
-        image = Image.open(io.BytesIO(image_data))
-        # image.save("screenshot.png")
-        image = np.array(image)
+        # edits as (kind, route name, route index, point index, point),
+        # undo applies the inverse, redo applies the edit again
+        self.undo_stack = collections.deque(maxlen=NautilusPilot.HISTORY_LENGTH)
+        self.redo_stack = []
 
-        return image
+    def screenshot(self):
+        return self.backend.screenshot()
 
+    @traced("find_kml_profile")
     def find_kml_profile(self, image):
         pixel_tolerance = 9
         gray_bar_color = np.array([225, 227, 225])
@@ -200,10 +1034,7 @@ class NautilusPilot:
         kml_icon_color = np.array([68, 71, 70])
 
         height, width, _ = image.shape
-        canvas_height, canvas_width = (
-            self.canvas.size["height"],
-            self.canvas.size["width"],
-        )
+        canvas_height, canvas_width = self.backend.canvas_size()
 
         gray_bar_head_y = 0
         while (
@@ -238,64 +1069,359 @@ class NautilusPilot:
         self.kml_profile_col_offset = col_offset
         self.kml_profile_row_offset = row_offset
 
+    @traced("update")
     def update(self, is_first=False):
-        if self.driver is None or self.canvas is None:
+        # the Wheelhouse uploads from its own thread and from store refreshes
+        with self.update_lock:
+            self.upload(is_first)
+
+    def upload(self, is_first):
+        if not self.backend.is_online():
             return
 
         if is_first:
-            image = self.screenshot()
+            with self.tracer.span("update.screenshot"):
+                image = self.screenshot()
             self.find_kml_profile(image)
 
         if not is_first:
-            ActionChains(self.driver).send_keys("\ue00c").perform()
-            ActionChains(self.driver).send_keys("\ue00c").perform()
-            ActionChains(self.driver).send_keys("\ue00c").perform()
+            with self.tracer.span("update.dismiss"):
+                self.backend.dismiss()
 
-        with open(NautilusPilot.KML_PATH, mode="r") as file:
-            content = file.read()
+        with self.tracer.span("update.read"):
+            with open(self.kml_path, mode="r") as file:
+                content = file.read()
+
+        with self.tracer.span("update.base64"):
             b64_content = base64.b64encode(content.encode()).decode()
 
-        self.driver.execute_script(
-            NautilusPilot.JS_DRAG_AND_DROP.format(
-                b64_content, os.path.basename(NautilusPilot.KML_PATH)
-            ),
-            self.canvas,
-        )
+        with self.tracer.span("update.drop"):
+            self.backend.drop(b64_content, os.path.basename(self.kml_path))
 
-        sleep(0.3)
-        ActionChains(self.driver).move_to_element_with_offset(
-            self.canvas, self.kml_profile_col_offset, self.kml_profile_row_offset
-        ).click().perform()
+        with self.tracer.span("update.settle"):
+            self.backend.settle()
+
+        with self.tracer.span("update.click"):
+            self.backend.click(self.kml_profile_col_offset, self.kml_profile_row_offset)
 
     def start_browser(self):
-        local_user_data_folder = os.path.join(os.getcwd(), "Local")
-        if not os.path.exists(local_user_data_folder):
-            os.makedirs(local_user_data_folder)
+        self.backend.start()
 
-        options = webdriver.EdgeOptions()
-        options.add_argument(f"user-data-dir={local_user_data_folder}")
-        options.add_argument("--disable-infobars")
+        self.update_kml()
+        self.update(is_first=True)
 
-        service = Service("msedgedriver.exe")
+    def stop_browser(self):
+        self.backend.stop()
 
-        self.driver = webdriver.Edge(service=service, options=options)
-        self.driver.get("https://earth.google.com/web")
 
-        sleep(3)
-        WebDriverWait(self.driver, 30).until(
-            lambda driver: driver.current_url.find("@") != -1
+class PinIndex:
+    """
+    Flat, searchable view of every pin, for the pin browser.
+    Rows are (route name, index in the route, point). Searches match pin
+    names by substring with a plain scan, a few milliseconds at 100k pins,
+    and a query that extends the previous one only narrows down the
+    previous matches.
+    """
+
+    def __init__(self, json_data):
+        self.rows = [("", i, point) for i, point in enumerate(json_data["points"])]
+        for route in json_data["routes"]:
+            route_name = route["name"]
+            self.rows.extend(
+                (route_name, i, point) for i, point in enumerate(route["points"])
+            )
+
+        self.names = [point["name"].lower() for _, _, point in self.rows]
+
+        self.last_query = ""
+        self.last_matches = range(len(self.rows))
+
+    def search(self, query):
+        """
+        Return the ids of the rows whose name contains query, in row order.
+        """
+        query = query.lower()
+
+        if query == "":
+            matches = range(len(self.rows))
+        elif self.last_query != "" and query.startswith(self.last_query):
+            names = self.names
+            matches = [i for i in self.last_matches if query in names[i]]
+        else:
+            matches = [i for i, name in enumerate(self.names) if query in name]
+
+        self.last_query = query
+        self.last_matches = matches
+        return matches
+
+    def describe(self, row_id):
+        route_name, _, point = self.rows[row_id]
+        return (
+            f"{point['name'][:28]:<28} {(route_name or '-')[:16]:<16}"
+            f"{point['latitude']:>10.4f}{point['longitude']:>10.4f}"
         )
 
-        self.canvas = self.driver.find_element(By.ID, "earth-canvas")
-        # self.canvas.click()
 
-        self.update_kml()
-        self.update(is_first=True)
+def parse_nmea(sentence):
+    """
+    Return (seconds of day, latitude, longitude) of an RMC or GGA sentence
+    with a valid fix, None for anything else. Seconds of day is None when
+    the sentence carries no time.
+    """
+    sentence = sentence.strip()
+    if not sentence.startswith("$"):
+        return None
 
-    def stop_browser(self):
-        self.driver.quit()
-        self.driver = None
-        self.canvas = None
+    body, _, checksum = sentence[1:].partition("*")
+    if checksum != "":
+        expected = 0
+        for c in body:
+            expected ^= ord(c)
+        try:
+            if int(checksum[:2], 16) != expected:
+                return None
+        except ValueError:
+            return None
+
+    fields = body.split(",")
+    match fields[0][2:]:
+        case "RMC":
+            if len(fields) < 7 or fields[2] != "A":
+                return None
+            clock, latitude, north_south, longitude, east_west = (
+                fields[1],
+                fields[3],
+                fields[4],
+                fields[5],
+                fields[6],
+            )
+        case "GGA":
+            if len(fields) < 7 or fields[6] in ("", "0"):
+                return None
+            clock, latitude, north_south, longitude, east_west = fields[1:6]
+        case _:
+            return None
+
+    try:
+        # ddmm.mmmm and dddmm.mmmm
+        latitude = int(latitude[:2]) + float(latitude[2:]) / 60
+        longitude = int(longitude[:3]) + float(longitude[3:]) / 60
+        seconds = None
+        if len(clock) >= 6:
+            seconds = int(clock[:2]) * 3600 + int(clock[2:4]) * 60 + float(clock[4:])
+    except ValueError:
+        return None
+
+    # North is positive, South is negative
+    if north_south == "S":
+        latitude = -latitude
+    # East is positive, West is negative
+    if east_west == "W":
+        longitude = -longitude
+
+    return seconds, latitude, longitude
+
+
+def haversine(latitude_a, longitude_a, latitude_b, longitude_b):
+    """
+    Great-circle distance in meters.
+    """
+    phi_a, phi_b = math.radians(latitude_a), math.radians(latitude_b)
+    d_phi = phi_b - phi_a
+    d_lambda = math.radians(longitude_b - longitude_a)
+    a = (
+        math.sin(d_phi / 2) ** 2
+        + math.cos(phi_a) * math.cos(phi_b) * math.sin(d_lambda / 2) ** 2
+    )
+    return 2 * 6371000 * math.asin(math.sqrt(a))
+
+
+async def nmea_replay(path, rate=10.0):
+    """
+    Lines of a recorded NMEA file, rate lines per second, as fast as
+    possible if rate is 0. Stands in for a receiver in tests and demos.
+    """
+    with open(path, "r", errors="replace") as nmea_file:
+        for line in nmea_file:
+            yield line
+            await asyncio.sleep(1 / rate if rate > 0 else 0)
+
+
+async def nmea_tcp(host, port, gpsd=False):
+    """
+    Lines of an NMEA stream over TCP. With gpsd, ask it for raw NMEA first.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        if gpsd:
+            writer.write(b'?WATCH={"enable":true,"nmea":true}\n')
+            await writer.drain()
+
+        while True:
+            line = await reader.readline()
+            if line == b"":
+                return
+            yield line.decode(errors="replace")
+    finally:
+        writer.close()
+
+
+async def nmea_serial(device, baudrate=4800):
+    """
+    Lines of an NMEA receiver on a serial port, needs pyserial.
+    Reads happen in a thread so the event loop never waits on the port.
+    """
+    import serial
+
+    port = serial.Serial(device, baudrate, timeout=1)
+    try:
+        while True:
+            line = await asyncio.to_thread(port.readline)
+            if line != b"":
+                yield line.decode(errors="replace")
+    finally:
+        port.close()
+
+
+def open_nmea_source(spec, rate=10.0):
+    """
+    tcp:HOST:PORT, gpsd:HOST[:PORT], serial:DEVICE[:BAUDRATE],
+    anything else is a file to replay.
+    """
+    kind, _, rest = spec.partition(":")
+    match kind:
+        case "tcp":
+            host, _, port = rest.rpartition(":")
+            return nmea_tcp(host, int(port))
+        case "gpsd":
+            host, _, port = rest.partition(":")
+            return nmea_tcp(host or "localhost", int(port or 2947), gpsd=True)
+        case "serial":
+            device, _, baudrate = rest.rpartition(":")
+            if device == "" or not baudrate.isdigit():
+                return nmea_serial(rest)
+            return nmea_serial(device, int(baudrate))
+        case _:
+            return nmea_replay(spec, rate)
+
+
+class TrackRecorder:
+    """
+    Appends the fixes of an NMEA feed to one route.
+
+    Fixes closer than min_distance meters or min_interval seconds to the
+    last kept one are dropped, the rest wait in a ring buffer of capacity
+    fixes (the oldest go first when it overflows) and are written to the
+    store in one batch every cadence seconds.
+
+    So the route grows by at most one point per min_interval, whatever the
+    feed rate: with the defaults a 10 Hz feed keeps one fix in ten, and
+    none while the ship moves less than 10 m. Set both to 0 to keep them all.
+    """
+
+    def __init__(
+        self,
+        natpi,
+        route_name,
+        min_distance=10.0,
+        min_interval=1.0,
+        capacity=1024,
+        cadence=2.0,
+    ):
+        self.natpi = natpi
+        self.route_name = route_name
+        self.min_distance = min_distance
+        self.min_interval = min_interval
+        self.cadence = cadence
+
+        self.buffer = collections.deque(maxlen=capacity)
+        self.last_fix = None
+
+        self.received = 0
+        self.dropped = 0
+        self.written = 0
+        self.errors = 0
+
+    def offer(self, fix):
+        seconds, latitude, longitude = fix
+        if seconds is None:
+            seconds = time.monotonic()
+
+        if self.last_fix is not None:
+            last_seconds, last_latitude, last_longitude = self.last_fix
+            elapsed = (seconds - last_seconds) % 86400
+            distance = haversine(last_latitude, last_longitude, latitude, longitude)
+            if elapsed < self.min_interval or distance < self.min_distance:
+                return False
+
+        self.last_fix = (seconds, latitude, longitude)
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+
+        clock = time.strftime("%H:%M:%S", time.gmtime(seconds % 86400))
+        self.buffer.append(
+            {"name": clock, "latitude": latitude, "longitude": longitude}
+        )
+        return True
+
+    async def flush(self):
+        points = list(self.buffer)
+        if len(points) == 0:
+            return False
+
+        dropped = self.dropped
+
+        # file I/O in a thread, the event loop keeps serving the feed and the TUI
+        await asyncio.to_thread(self.natpi.append_track, self.route_name, points)
+        self.written += len(points)
+
+        # only now let go of the written fixes, if the buffer overflowed in the
+        # meantime the oldest of them are already gone
+        for _ in range(max(0, len(points) - (self.dropped - dropped))):
+            self.buffer.popleft()
+        return True
+
+    async def run(self, source, on_flush=None, on_error=None):
+        """
+        Read source until it ends, flushing every cadence seconds and once
+        more at the end. on_flush is called after each write, on_error with
+        the exception of each failed one, whose fixes stay buffered for the
+        next flush.
+        """
+
+        # a flush is never cancelled, its write would go on in the thread and
+        # the fixes it wrote would be written again by the final flush
+        stopped = asyncio.Event()
+
+        async def flusher():
+            while True:
+                try:
+                    await asyncio.wait_for(stopped.wait(), self.cadence)
+                    return
+                except asyncio.TimeoutError:
+                    pass
+                try:
+                    flushed = await self.flush()
+                except Exception as error:
+                    self.errors += 1
+                    if on_error is not None:
+                        on_error(error)
+                    continue
+                if flushed and on_flush is not None:
+                    on_flush()
+
+        flush_task = asyncio.create_task(flusher())
+        try:
+            async for line in source:
+                self.received += 1
+                fix = parse_nmea(line)
+                if fix is not None:
+                    self.offer(fix)
+        finally:
+            stopped.set()
+            await flush_task
+            if await self.flush() and on_flush is not None:
+                on_flush()
 
 
 class Wheelhouse(App):
@@ -303,6 +1429,7 @@ class Wheelhouse(App):
         MAIN = auto()
         NEW_PIN = auto()
         REMOVE_PIN = auto()
+        BROWSE = auto()
 
     class Status(Static):
         is_online = reactive(False)
@@ -498,15 +1625,150 @@ class Wheelhouse(App):
                 ),
             )
 
+    class PinList(ScrollView):
+        """
+        Pins of a PinIndex, one per line. Only the lines in view are
+        rendered, so the list stays cheap however many pins there are.
+        """
+
+        # the cursor follows the keys of the search input, see on_key
+        can_focus = False
+
+        DEFAULT_CSS = """
+        PinList {
+            height: 12;
+            border: round white;
+        }
+        """
+
+        def __init__(self, id=None):
+            super().__init__(id=id)
+
+            self.pin_index = PinIndex({"points": [], "routes": []})
+            self.matches = range(0)
+            self.cursor = 0
+
+        def set_index(self, pin_index, query=""):
+            self.pin_index = pin_index
+            self.search(query)
+
+        def search(self, query):
+            self.matches = self.pin_index.search(query)
+            self.cursor = max(0, min(self.cursor, len(self.matches) - 1))
+            self.virtual_size = Size(self.size.width, len(self.matches))
+            self.scroll_to_cursor()
+            self.refresh()
+
+        def move_cursor(self, delta):
+            if len(self.matches) == 0:
+                return
+            self.cursor = max(0, min(self.cursor + delta, len(self.matches) - 1))
+            self.scroll_to_cursor()
+            self.refresh()
+
+        def scroll_to_cursor(self):
+            height = self.scrollable_content_region.height
+            if self.cursor < self.scroll_y:
+                self.scroll_to(y=self.cursor, animate=False)
+            elif height > 0 and self.cursor >= self.scroll_y + height:
+                self.scroll_to(y=self.cursor - height + 1, animate=False)
+
+        def selected(self):
+            if len(self.matches) == 0:
+                return None
+            return self.pin_index.rows[self.matches[self.cursor]]
+
+        def render_line(self, y):
+            width = self.scrollable_content_region.width
+            line = int(self.scroll_y) + y
+            if line >= len(self.matches):
+                return Strip.blank(width, self.rich_style)
+
+            style = self.rich_style
+            if line == self.cursor:
+                style = style + Style(reverse=True)
+
+            text = self.pin_index.describe(self.matches[line])
+            return Strip([Segment(text[:width].ljust(width), style)])
+
+    class PinBrowser(Static):
+        DEFAULT_CSS = """
+        .pin-form-label {
+            margin-top: 1;
+        }
+
+        #browse-search-input {
+            width: 44;
+            margin-right: 2;
+        }
+
+        #browse-remove-button {
+            width: 21;
+            margin-left: 9;
+        }
+
+        #cancel-browse-button {
+            width: 21;
+        }
+        """
+
+        def compose(self):
+            yield Vertical(
+                Horizontal(
+                    Label("          *** Browse pins! ***"),
+                ),
+                Horizontal(
+                    Label("   Search:", classes="pin-form-label"),
+                    Input(id="browse-search-input", type="text"),
+                ),
+                Wheelhouse.PinList(id="pin-list"),
+                Horizontal(
+                    Button("🌟 Remove", id="browse-remove-button", variant="error"),
+                    Button("🌟 Cancel", id="cancel-browse-button", variant="warning"),
+                ),
+            )
+
+    class TraceOverlay(Static):
+        def __init__(self, tracer, id=None):
+            super().__init__(id=id)
+
+            self.tracer = tracer
+
+        def on_mount(self):
+            if self.tracer.enabled:
+                self.set_interval(1.0, self.refresh_stats)
+
+        def refresh_stats(self):
+            if self.visible:
+                self.refresh()
+
+        def render(self):
+            stats = self.tracer.percentiles()
+            if len(stats) == 0:
+                return "No spans yet"
+
+            lines = [f"{'stage':<20}{'count':>7}{'p50 ms':>11}{'p95 ms':>11}"]
+            for name, (count, p50, p95) in sorted(stats.items()):
+                lines.append(f"{name:<20}{count:>7}{p50:>11.2f}{p95:>11.2f}")
+            return "\n".join(lines)
+
     is_online = reactive(False)
 
+    STORE_POLL_SECONDS = 1.0
+
     CSS_PATH = "wheelhouse-style.tcss"
 
-    def __init__(self):
+    def __init__(self, tracer=None, track_source=None, track_recorder=None):
         super().__init__()
 
-        self.natpi = NautilusPilot()
+        self.tracer = Tracer() if tracer is None else tracer
+        self.natpi = NautilusPilot(tracer=self.tracer)
+
+        # with a source, the recorder draws it into the store
+        self.track_source = track_source
+        self.track_recorder = track_recorder
         self.state = Wheelhouse.State.MAIN
+        self.store_refreshing = False
 
     def sail(self):
         self.run()
@@ -533,6 +1795,12 @@ class Wheelhouse(App):
                 classes="main-buttons",
                 variant="primary",
             ),
+            Button(
+                "🌟 Browse pins",
+                id="browse-button",
+                classes="main-buttons",
+                variant="primary",
+            ),
             Button(
                 "🌟 Leave", id="leave-button", classes="main-buttons", variant="primary"
             ),
@@ -540,7 +1808,9 @@ class Wheelhouse(App):
         )
         yield Wheelhouse.NewPinForm()
         yield Wheelhouse.RemovePinForm()
+        yield Wheelhouse.PinBrowser()
         yield Label(id="message-label")
+        yield Wheelhouse.TraceOverlay(self.tracer)
 
     def on_mount(self):
         # main
@@ -550,11 +1820,13 @@ class Wheelhouse(App):
         self.switch_button = self.query_one("#switch-button")
         self.new_pin_button = self.query_one("#new-pin-button")
         self.remove_pin_button = self.query_one("#remove-pin-button")
+        self.browse_button = self.query_one("#browse-button")
         self.leave_button = self.query_one("#leave-button")
         self.main_focusables = [
             self.switch_button,
             self.new_pin_button,
             self.remove_pin_button,
+            self.browse_button,
             self.leave_button,
         ]
 
@@ -606,13 +1878,50 @@ class Wheelhouse(App):
             self.cancel_remove_button,
         ]
 
+        ### pin browser
+        self.pin_browser = self.query_one(Wheelhouse.PinBrowser)
+        self.pin_browser.visible = False
+        self.browse_search_input = self.query_one("#browse-search-input")
+        self.pin_list = self.query_one(Wheelhouse.PinList)
+        self.browse_remove_button = self.query_one("#browse-remove-button")
+        self.cancel_browse_button = self.query_one("#cancel-browse-button")
+
+        self.pin_browser_focusables = [
+            self.browse_search_input,
+            self.browse_remove_button,
+            self.cancel_browse_button,
+        ]
+
         self.all_focusables = (
             self.main_focusables
             + self.new_pin_form_focusables
             + self.remove_pin_form_focusables
+            + self.pin_browser_focusables
         )
         self.focusables = self.main_focusables
 
+        # trace overlay, toggled with F2 when tracing is on
+        self.trace_overlay = self.query_one(Wheelhouse.TraceOverlay)
+        self.trace_overlay.visible = False
+
+        # pick up pins added by other Wheelhouses and scripts
+        self.set_interval(Wheelhouse.STORE_POLL_SECONDS, self.watch_store)
+
+        if self.track_source is not None and self.track_recorder is not None:
+            self.run_worker(self.record_track(), exclusive=True)
+
+    async def record_track(self):
+        try:
+            await self.track_recorder.run(
+                self.track_source,
+                on_flush=self.watch_store,
+                on_error=lambda error: self.run_worker(
+                    self.show_message("Track not saved!"), thread=True
+                ),
+            )
+        except Exception:
+            self.run_worker(self.show_message("Track lost!"), thread=True)
+
     async def show_message(self, message, mississippi=0.75):
         self.message_label.render = lambda: message
         self.message_label.visible = True
@@ -630,6 +1939,8 @@ class Wheelhouse(App):
                 self.focusables = self.new_pin_form_focusables
             case Wheelhouse.State.REMOVE_PIN:
                 self.focusables = self.remove_pin_form_focusables
+            case Wheelhouse.State.BROWSE:
+                self.focusables = self.pin_browser_focusables
         self.update_focusable()
 
         match (old_state, new_state):
@@ -647,6 +1958,14 @@ class Wheelhouse(App):
                 self.remove_pin_form.visible = False
                 self.clear_remove_pin_form()
                 self.remove_pin_button.focus()
+            case (Wheelhouse.State.MAIN, Wheelhouse.State.BROWSE):
+                self.pin_browser.visible = True
+                self.refresh_pin_browser()
+                self.browse_search_input.focus()
+            case (Wheelhouse.State.BROWSE, Wheelhouse.State.MAIN):
+                self.pin_browser.visible = False
+                self.clear_pin_browser()
+                self.browse_button.focus()
 
     def update_focusable(self):
         for widget in self.all_focusables:
@@ -682,6 +2001,8 @@ class Wheelhouse(App):
                     go_up_cheatsheet = [0, 0, 1, 1]
                     current_focus = self.current_focus()
                     self.focusables[go_up_cheatsheet[current_focus]].focus()
+                elif self.state == Wheelhouse.State.BROWSE:
+                    self.pin_list.move_cursor(-1)
                 else:
                     self.previous_focus()
 
@@ -690,9 +2011,16 @@ class Wheelhouse(App):
                     go_down_cheatsheet = [1, 2, 5, 6, 7, 8, 8, 8, 9, 9]
                     current_focus = self.current_focus()
                     self.focusables[go_down_cheatsheet[current_focus]].focus()
+                elif self.state == Wheelhouse.State.BROWSE:
+                    self.pin_list.move_cursor(1)
                 else:
                     self.next_focus()
 
+            case "pageup" | "pagedown":
+                if self.state == Wheelhouse.State.BROWSE:
+                    page = self.pin_list.scrollable_content_region.height
+                    self.pin_list.move_cursor(-page if event.key == "pageup" else page)
+
             case "left":
                 if self.state == Wheelhouse.State.NEW_PIN:
                     current_focus = self.current_focus()
@@ -701,6 +2029,9 @@ class Wheelhouse(App):
                 if self.state == Wheelhouse.State.REMOVE_PIN:
                     current_focus = self.current_focus()
                     self.previous_focus()
+
+                if self.state == Wheelhouse.State.BROWSE:
+                    self.previous_focus()
             case "right":
                 if self.state == Wheelhouse.State.NEW_PIN:
                     current_focus = self.current_focus()
@@ -709,6 +2040,15 @@ class Wheelhouse(App):
                 if self.state == Wheelhouse.State.REMOVE_PIN:
                     current_focus = self.current_focus()
                     self.next_focus()
+
+                if self.state == Wheelhouse.State.BROWSE:
+                    self.next_focus()
+            case "ctrl+z" | "ctrl+y":
+                if self.state == Wheelhouse.State.MAIN:
+                    self.replay_history(redo=event.key == "ctrl+y")
+            case "f2":
+                if self.tracer.enabled:
+                    self.trace_overlay.visible = not self.trace_overlay.visible
             case "escape":
                 if self.state == Wheelhouse.State.NEW_PIN:
                     self.change_state(Wheelhouse.State.MAIN)
@@ -716,6 +2056,47 @@ class Wheelhouse(App):
                 if self.state == Wheelhouse.State.REMOVE_PIN:
                     self.change_state(Wheelhouse.State.MAIN)
                     return
+                if self.state == Wheelhouse.State.BROWSE:
+                    self.change_state(Wheelhouse.State.MAIN)
+                    return
+
+    def watch_store(self):
+        if self.store_refreshing:
+            return
+        try:
+            if not self.natpi.store_changed():
+                return
+        except Exception:
+            return
+
+        # the KML rebuild and the upload take long on big stores, keep them
+        # off the event loop
+        self.store_refreshing = True
+        self.run_worker(self.refresh_store, thread=True)
+
+    def refresh_store(self):
+        try:
+            self.natpi.reload()
+            if self.state == Wheelhouse.State.BROWSE:
+                self.call_from_thread(self.refresh_pin_browser)
+            self.natpi.update()
+        except Exception:
+            pass
+        finally:
+            self.store_refreshing = False
+
+    def replay_history(self, redo=False):
+        try:
+            if redo:
+                success, message = self.natpi.redo()
+            else:
+                success, message = self.natpi.undo()
+        except Exception:
+            success, message = False, "Error!"
+
+        self.run_worker(self.show_message(message), thread=True)
+        if success:
+            self.natpi.update()
 
     ### new pin form funtions #################################################################
     def clear_new_pin_form(self):
@@ -787,6 +2168,38 @@ class Wheelhouse(App):
         else:
             return message
 
+    ###########################################################################################
+    ### pin browser funtions ##################################################################
+
+    def refresh_pin_browser(self):
+        try:
+            # under the lock, a store refresh may be catching up in its thread
+            with self.natpi.store_lock():
+                pin_index = PinIndex(self.natpi.sync())
+        except Exception:
+            pin_index = PinIndex({"points": [], "routes": []})
+        self.pin_list.set_index(pin_index, self.browse_search_input.value)
+
+    def clear_pin_browser(self):
+        self.browse_search_input.value = ""
+        self.browse_search_input.refresh()
+        self.pin_list.set_index(PinIndex({"points": [], "routes": []}))
+
+    def on_input_changed(self, event):
+        if event.input is self.browse_search_input:
+            self.pin_list.search(event.value)
+
+    def remove_selected_pin(self):
+        selected = self.pin_list.selected()
+        if selected is None:
+            return False, "No pin selected!"
+
+        route_name, index, point = selected
+        try:
+            return self.natpi.remove_point(point["name"], route_name, index=index)
+        except Exception:
+            return False, "Error!"
+
     ###########################################################################################
 
     async def on_button_pressed(self, event):
@@ -802,11 +2215,15 @@ class Wheelhouse(App):
                 self.change_state(Wheelhouse.State.NEW_PIN)
             case self.remove_pin_button:
                 self.change_state(Wheelhouse.State.REMOVE_PIN)
+            case self.browse_button:
+                self.change_state(Wheelhouse.State.BROWSE)
             case self.leave_button:
                 try:
                     self.natpi.stop_browser()
                 except Exception:
                     pass
+                if self.tracer.enabled:
+                    self.tracer.export_chrome_trace(NautilusPilot.TRACE_PATH)
                 self.exit()
             # new pin form
             case self.add_pin_button:
@@ -832,10 +2249,353 @@ class Wheelhouse(App):
                     self.natpi.update()
             case self.cancel_remove_button:
                 self.change_state(Wheelhouse.State.MAIN)
+            # pin browser
+            case self.browse_remove_button:
+                success, message = self.remove_selected_pin()
+
+                self.run_worker(self.show_message(message), thread=True)
+                if success:
+                    self.refresh_pin_browser()
+                    self.natpi.update()
+            case self.cancel_browse_button:
+                self.change_state(Wheelhouse.State.MAIN)
+
+
+def synthesize_voyage(size, route_length=100, seed=0):
+    """
+    Make a data.json-shaped voyage with size points in total,
+    a tenth of them as loose pins and the rest split into routes.
+    """
+    rng = random.Random(seed)
+
+    def random_point(i):
+        return {
+            "name": f"point {i}",
+            "latitude": rng.uniform(-80, 80),
+            "longitude": rng.uniform(-180, 180),
+        }
+
+    pin_count = size // 10
+    json_data = {
+        "points": [random_point(i) for i in range(pin_count)],
+        "routes": [],
+    }
+
+    i = pin_count
+    while i < size:
+        length = min(route_length, size - i)
+        json_data["routes"].append(
+            {
+                "name": f"route {len(json_data['routes'])}",
+                "points": [random_point(i + j) for j in range(length)],
+            }
+        )
+        i += length
+
+    return json_data
+
+
+def bench_pilot(size, repeat, folder, tracer=None):
+    """
+    Time a NautilusPilot on a CanvasBackend over a synthetic voyage:
+    first upload, KML profile detection and edit -> update latency.
+    """
+    json_path = os.path.join(folder, "data.json")
+    kml_path = os.path.join(folder, "data.kml")
+    with open(json_path, "w") as json_file:
+        json.dump(synthesize_voyage(size), json_file)
+
+    backend = CanvasBackend()
+    natpi = NautilusPilot(
+        backend=backend, json_path=json_path, kml_path=kml_path, tracer=tracer
+    )
+
+    begin = time.perf_counter()
+    natpi.start_browser()
+    start_seconds = time.perf_counter() - begin
+
+    image = natpi.screenshot()
+    begin = time.perf_counter()
+    natpi.find_kml_profile(image)
+    detection_seconds = time.perf_counter() - begin
+
+    edit_update_seconds = []
+    for i in range(repeat):
+        begin = time.perf_counter()
+        natpi.add_point(f"bench {i}", "", 0.0, 0.0)
+        natpi.update()
+        edit_update_seconds.append(time.perf_counter() - begin)
+
+    natpi.stop_browser()
+
+    return {
+        "size": size,
+        "start_seconds": start_seconds,
+        "detection_seconds": detection_seconds,
+        "edit_update_seconds": statistics.median(edit_update_seconds),
+        "payload_bytes": backend.uploads[-1]["payload_bytes"],
+        "icon_hit": all(hit for _, _, hit in backend.clicks),
+    }
+
+
+def file_size(path):
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def measure_stage(stage, op, repeat, rewritten_paths=(), appended_paths=()):
+    """
+    Call op(i) repeat times for the timing, then once more under
+    tracemalloc for the memory peak. Bytes written per op counts the whole
+    of every file in rewritten_paths and what each op added to the files
+    in appended_paths.
+    """
+    seconds = []
+    bytes_written = []
+    for i in range(repeat):
+        appended_before = sum(file_size(path) for path in appended_paths)
+        begin = time.perf_counter()
+        op(i)
+        seconds.append(time.perf_counter() - begin)
+        bytes_written.append(
+            sum(file_size(path) for path in rewritten_paths)
+            + sum(file_size(path) for path in appended_paths)
+            - appended_before
+        )
+
+    tracemalloc.start()
+    op(repeat)
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "stage": stage,
+        "seconds_per_op": statistics.median(seconds),
+        "peak_bytes": peak_bytes,
+        "bytes_written": int(statistics.median(bytes_written)),
+    }
+
+
+def bench_storage(size, repeat, folder):
+    """
+    Measure the storage and KML hot paths of a NautilusPilot over a
+    synthetic voyage, one stage at a time.
+    """
+    json_path = os.path.join(folder, "data.json")
+    kml_path = os.path.join(folder, "data.kml")
+    json_data = synthesize_voyage(size)
+    with open(json_path, "w") as json_file:
+        json.dump(json_data, json_file)
+
+    natpi = NautilusPilot(
+        backend=CanvasBackend(), json_path=json_path, kml_path=kml_path
+    )
+    route_name = json_data["routes"][-1]["name"] if json_data["routes"] else ""
+    image = natpi.screenshot()
+
+    return [
+        measure_stage(
+            "get_route", lambda i: natpi.get_route(json_data, route_name), repeat
+        ),
+        measure_stage("update_kml", lambda i: natpi.update_kml(), repeat, [kml_path]),
+        measure_stage(
+            "add_point",
+            lambda i: natpi.add_point("bench", route_name, 0.0, 0.0),
+            repeat,
+            [json_path, kml_path],
+            [natpi.journal_path],
+        ),
+        measure_stage(
+            "remove_point",
+            lambda i: natpi.remove_point("bench", route_name),
+            repeat,
+            [json_path, kml_path],
+            [natpi.journal_path],
+        ),
+        measure_stage(
+            "find_kml_profile", lambda i: natpi.find_kml_profile(image), repeat
+        ),
+    ]
+
+
+def compare_bench(results, baseline):
+    """
+    Print the time per op and bytes written of every stage, and the upload
+    payload, against a previous bench file.
+    """
+    previous = {}
+    for result in baseline["results"]:
+        previous[(result["size"], "payload")] = result["pilot"]["payload_bytes"]
+        for stage in result["stages"]:
+            previous[(result["size"], stage["stage"])] = stage
+
+    def ratio(value, previous_value):
+        if previous_value == 0:
+            return "     -"
+        return f"x{value / previous_value:5.2f}"
+
+    print(f"compared with {baseline['commit'] or 'unknown commit'}:")
+    for result in results:
+        key = (result["size"], "payload")
+        if key in previous:
+            print(
+                f"{result['size']:>8} points | {'payload':<16} | "
+                f"{'':>12} | size {ratio(result['pilot']['payload_bytes'], previous[key])}"
+            )
+
+        for stage in result["stages"]:
+            key = (result["size"], stage["stage"])
+            if key not in previous:
+                continue
+            print(
+                f"{result['size']:>8} points | {stage['stage']:<16} | "
+                f"time {ratio(stage['seconds_per_op'], previous[key]['seconds_per_op'])} | "
+                f"written {ratio(stage['bytes_written'], previous[key]['bytes_written'])}"
+            )
+
+
+def bench(sizes, repeat, output=None, baseline=None, trace=None):
+    tracer = Tracer(enabled=trace is not None, capacity=1 << 20)
+
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as folder:
+            pilot = bench_pilot(size, repeat, folder, tracer)
+        with tempfile.TemporaryDirectory() as folder:
+            stages = bench_storage(size, repeat, folder)
+        results.append({"size": size, "pilot": pilot, "stages": stages})
+
+        print(
+            f"{pilot['size']:>8} points | "
+            f"start {pilot['start_seconds'] * 1000:10.2f} ms | "
+            f"detection {pilot['detection_seconds'] * 1000:8.2f} ms | "
+            f"edit->update {pilot['edit_update_seconds'] * 1000:10.2f} ms | "
+            f"payload {pilot['payload_bytes']:>11} B | "
+            f"icon {'hit' if pilot['icon_hit'] else 'MISSED'}"
+        )
+        for stage in stages:
+            print(
+                f"{'':>8}        | "
+                f"{stage['stage']:<16} | "
+                f"{stage['seconds_per_op'] * 1000:10.3f} ms/op | "
+                f"peak {stage['peak_bytes'] / 2**20:9.2f} MiB | "
+                f"written {stage['bytes_written']:>11} B"
+            )
+
+    if trace is not None:
+        tracer.export_chrome_trace(trace)
+
+    if baseline is not None:
+        with open(baseline, "r") as baseline_file:
+            compare_bench(results, json.load(baseline_file))
+
+    if output is not None:
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        except Exception:
+            commit = None
+
+        with open(output, "w") as output_file:
+            json.dump(
+                {
+                    "commit": commit,
+                    "python": sys.version.split()[0],
+                    "repeat": repeat,
+                    "results": results,
+                },
+                output_file,
+                indent=4,
+            )
 
 
 def main():
-    wheelhouse = Wheelhouse()
+    parser = argparse.ArgumentParser(prog="natpi")
+    parser.add_argument(
+        "--track",
+        metavar="SOURCE",
+        help="draw our own track from NMEA: tcp:HOST:PORT, gpsd:HOST[:PORT], "
+        "serial:DEVICE[:BAUDRATE] or a file to replay",
+    )
+    parser.add_argument("--track-route", default="Track")
+    parser.add_argument(
+        "--track-min-distance",
+        type=float,
+        default=10.0,
+        help="meters from the last kept fix before keeping another",
+    )
+    parser.add_argument(
+        "--track-min-interval",
+        type=float,
+        default=1.0,
+        help="seconds from the last kept fix before keeping another",
+    )
+    parser.add_argument(
+        "--track-cadence",
+        type=float,
+        default=2.0,
+        help="seconds between writes of the kept fixes",
+    )
+    parser.add_argument(
+        "--replay-rate", type=float, default=10.0, help="lines per second"
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="time the hot paths, show them with F2 and save them on leave",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    bench_parser = subparsers.add_parser(
+        "bench", help="benchmark the pilot and its hot paths on synthetic voyages"
+    )
+    bench_parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000, 10000, 100000]
+    )
+    bench_parser.add_argument("--repeat", type=int, default=5)
+    bench_parser.add_argument("--output", help="save the results as JSON")
+    bench_parser.add_argument(
+        "--trace-file",
+        metavar="PATH",
+        help="save the spans of the pilot runs as a Chrome trace, "
+        f"--trace alone saves them to {NautilusPilot.TRACE_PATH}",
+    )
+    bench_parser.add_argument(
+        "--compare", help="compare against the JSON of a previous run"
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        trace_path = args.trace_file
+        if trace_path is None and args.trace:
+            trace_path = NautilusPilot.TRACE_PATH
+        bench(args.sizes, args.repeat, args.output, args.compare, trace_path)
+        return
+
+    tracer = Tracer(enabled=args.trace)
+
+    track_source = None
+    track_recorder = None
+    if args.track is not None:
+        track_source = open_nmea_source(args.track, args.replay_rate)
+
+        # the recorder writes through its own pilot, like another process
+        # would, append_track never starts its backend
+        track_recorder = TrackRecorder(
+            NautilusPilot(tracer=tracer),
+            args.track_route,
+            min_distance=args.track_min_distance,
+            min_interval=args.track_min_interval,
+            cadence=args.track_cadence,
+        )
+
+    wheelhouse = Wheelhouse(
+        tracer=tracer, track_source=track_source, track_recorder=track_recorder
+    )
     wheelhouse.sail()
 
 
@@ -0,0 +1,163 @@
+import json
+import multiprocessing
+import xml.etree.ElementTree as ElementTree
+
+import pytest
+
+import natpi
+
+
+def make_pilot(folder, name="data.kml"):
+    return natpi.NautilusPilot(
+        backend=natpi.CanvasBackend(),
+        json_path=str(folder / "data.json"),
+        kml_path=str(folder / name),
+        tracer=natpi.Tracer(enabled=True),
+    )
+
+
+def read_store(folder):
+    with open(folder / "data.json", "r") as json_file:
+        return json.load(json_file)
+
+
+def span_names(pilot):
+    return [name for name, _, _, _ in pilot.tracer.spans]
+
+
+def read_placemarks(path):
+    namespace = {"kml": "http://www.opengis.net/kml/2.2"}
+    root = ElementTree.parse(path).getroot()
+    return [
+        (
+            placemark.findtext("kml:name", namespaces=namespace),
+            placemark.findtext(".//kml:coordinates", namespaces=namespace),
+        )
+        for placemark in root.iterfind(".//kml:Placemark", namespace)
+    ]
+
+
+def add_pins(folder, writer, count):
+    pilot = make_pilot(folder, f"data{writer}.kml")
+    for i in range(count):
+        pilot.add_point(f"{writer}-{i}", "shared" if i % 2 else "", 1.0, 2.0)
+
+
+@pytest.fixture
+def folder(tmp_path):
+    with open(tmp_path / "data.json", "w") as json_file:
+        json.dump(natpi.synthesize_voyage(100), json_file)
+    return tmp_path
+
+
+def test_concurrent_writers_lose_no_edits(folder):
+    writers = [
+        multiprocessing.Process(target=add_pins, args=(folder, writer, 25))
+        for writer in range(4)
+    ]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+        assert writer.exitcode == 0
+
+    json_data = read_store(folder)
+    names = [point["name"] for point in json_data["points"]]
+    names += [
+        point["name"] for route in json_data["routes"] for point in route["points"]
+    ]
+    assert len(names) == 100 + 4 * 25
+    assert all(f"{writer}-{i}" in names for writer in range(4) for i in range(25))
+
+
+def test_reader_catches_up_from_the_journal(folder):
+    writer = make_pilot(folder)
+    reader = make_pilot(folder, "reader.kml")
+    reader.load()
+
+    writer.add_point("a", "", 1.0, 2.0)
+    writer.add_point("b", "route 0", 3.0, 4.0)
+    writer.remove_point("a", "")
+
+    reader.tracer.spans.clear()
+    assert reader.store_changed()
+    assert reader.load() == read_store(folder)
+    assert "journal.read" in span_names(reader)
+    assert "json.read" not in span_names(reader)
+    assert not reader.store_changed()
+
+
+def test_hand_edit_forces_a_full_reload(folder):
+    writer = make_pilot(folder)
+    reader = make_pilot(folder, "reader.kml")
+    reader.load()
+
+    writer.add_point("a", "", 1.0, 2.0)
+    json_data = read_store(folder)
+    json_data["points"].append({"name": "hand", "latitude": 0.0, "longitude": 0.0})
+    with open(folder / "data.json", "w") as json_file:
+        json.dump(json_data, json_file)
+
+    reader.tracer.spans.clear()
+    assert reader.load() == json_data
+    assert "json.read" in span_names(reader)
+
+
+def test_readers_survive_journal_restarts(folder, monkeypatch):
+    monkeypatch.setattr(natpi.NautilusPilot, "JOURNAL_LENGTH", 3)
+    writer = make_pilot(folder)
+    frequent = make_pilot(folder, "frequent.kml")
+    rare = make_pilot(folder, "rare.kml")
+    frequent.load()
+    rare.load()
+
+    for i in range(10):
+        writer.add_point(str(i), "", 0.0, 0.0)
+        assert frequent.load() == read_store(folder)
+
+    assert rare.load() == read_store(folder)
+
+    # and a reader can write after catching up
+    rare.add_point("rare", "", 0.0, 0.0)
+    assert writer.load() == read_store(folder)
+
+
+def test_history_survives_appends_to_other_routes(folder):
+    pilot = make_pilot(folder)
+    recorder = make_pilot(folder, "recorder.kml")
+
+    pilot.add_point("mine", "", 1.0, 2.0)
+    recorder.append_track("Track", [{"name": "fix", "latitude": 0, "longitude": 0}])
+
+    assert pilot.undo() == (True, "mine removed!")
+    assert "mine" not in [point["name"] for point in read_store(folder)["points"]]
+
+
+def test_history_is_dropped_when_its_points_move(folder):
+    pilot = make_pilot(folder)
+    other = make_pilot(folder, "other.kml")
+
+    pilot.add_point("mine", "", 1.0, 2.0)
+    other.remove_point("point 0", "")
+
+    assert pilot.undo() == (False, "Nothing to undo!")
+
+
+def test_undo_and_redo_patch_the_kml(folder):
+    pilot = make_pilot(folder)
+    reference = make_pilot(folder, "reference.kml")
+
+    pilot.add_point("pin", "", 1.0, 2.0)
+    pilot.add_point("fix", "route 0", 3.0, 4.0)
+    pilot.add_point("alone", "new route", 5.0, 6.0)
+    pilot.remove_point("point 3", "")
+
+    for step in [pilot.undo] * 4 + [pilot.redo] * 4:
+        pilot.tracer.spans.clear()
+        assert step()[0]
+        assert "kml.build" not in span_names(pilot)
+
+        reference.update_kml()
+        assert read_placemarks(folder / "data.kml") == read_placemarks(
+            folder / "reference.kml"
+        )
@@ -0,0 +1,158 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+import natpi
+
+
+def sentence(body):
+    checksum = 0
+    for c in body:
+        checksum ^= ord(c)
+    return f"${body}*{checksum:02X}"
+
+
+def rmc(clock, latitude, longitude, status="A"):
+    return sentence(
+        f"GPRMC,{clock},{status},{latitude},N,{longitude},E,0.0,0.0,191026,,"
+    )
+
+
+def fixes(count, seconds=2.0, degrees=0.01):
+    # far enough apart in time and space to pass the default thinning
+    return [(12 * 3600 + i * seconds, 45.0 + i * degrees, 10.0) for i in range(count)]
+
+
+def lines(fixes):
+    for seconds, latitude, longitude in fixes:
+        clock = time.strftime("%H%M%S", time.gmtime(seconds))
+        minutes = (latitude % 1) * 60
+        yield rmc(
+            clock, f"{int(latitude):02d}{minutes:07.4f}", f"{int(longitude):03d}00.0000"
+        )
+
+
+@pytest.fixture
+def pilot(tmp_path):
+    with open(tmp_path / "data.json", "w") as json_file:
+        json.dump(natpi.synthesize_voyage(10), json_file)
+    return natpi.NautilusPilot(
+        backend=natpi.CanvasBackend(),
+        json_path=str(tmp_path / "data.json"),
+        kml_path=str(tmp_path / "data.kml"),
+    )
+
+
+def track(pilot, route_name="Track"):
+    return pilot.get_route(pilot.load(), route_name)["points"]
+
+
+def test_parse_nmea_reads_rmc_and_gga():
+    seconds, latitude, longitude = natpi.parse_nmea(
+        "$GPRMC,123519,A,4807.038,N,01131.000,E,022.4,084.4,230394,003.1,W*6A"
+    )
+    assert seconds == 12 * 3600 + 35 * 60 + 19
+    assert latitude == pytest.approx(48 + 7.038 / 60)
+    assert longitude == pytest.approx(11 + 31 / 60)
+
+    gga = sentence("GPGGA,123519,4807.038,S,01131.000,W,1,08,0.9,545.4,M,46.9,M,,")
+    assert natpi.parse_nmea(gga + "\r\n") == (seconds, -latitude, -longitude)
+
+
+def test_parse_nmea_rejects_bad_checksums_and_missing_fixes():
+    good = "$GPRMC,123519,A,4807.038,N,01131.000,E,022.4,084.4,230394,003.1,W*6A"
+    assert natpi.parse_nmea(good) is not None
+    assert natpi.parse_nmea(good[:-2] + "6B") is None
+
+    assert natpi.parse_nmea(rmc("123519", "4807.038", "01131.000", status="V")) is None
+    assert (
+        natpi.parse_nmea(sentence("GPGGA,123519,4807.038,N,01131.000,E,0,00,,,M,,M,,"))
+        is None
+    )
+    assert natpi.parse_nmea(sentence("GPGSV,3,1,11,03,03,111,00")) is None
+    assert natpi.parse_nmea("garbage") is None
+
+
+def test_haversine():
+    assert natpi.haversine(45.0, 10.0, 45.0, 10.0) == 0
+    assert natpi.haversine(0.0, 0.0, 1.0, 0.0) == pytest.approx(111195, rel=1e-3)
+
+
+def test_recorder_thins_by_distance_and_time(pilot):
+    recorder = natpi.TrackRecorder(pilot, "Track", min_distance=100, min_interval=5)
+
+    assert recorder.offer((0.0, 45.0, 10.0))
+    # too close
+    assert not recorder.offer((10.0, 45.0005, 10.0))
+    # too soon
+    assert not recorder.offer((4.0, 45.01, 10.0))
+    assert recorder.offer((10.0, 45.01, 10.0))
+    # past midnight
+    assert recorder.offer((2.0, 45.02, 10.0))
+
+    assert [point["name"] for point in recorder.buffer] == [
+        "00:00:00",
+        "00:00:10",
+        "00:00:02",
+    ]
+
+
+def test_recorder_counts_what_the_ring_buffer_drops(pilot):
+    recorder = natpi.TrackRecorder(pilot, "Track", capacity=3)
+    for fix in fixes(5):
+        assert recorder.offer(fix)
+
+    assert recorder.dropped == 2
+    assert [point["latitude"] for point in recorder.buffer] == [45.02, 45.03, 45.04]
+
+
+def test_recorder_retries_a_failed_write(pilot, monkeypatch):
+    recorder = natpi.TrackRecorder(pilot, "Track")
+    append_track = pilot.append_track
+    calls = []
+
+    def flaky_append_track(route_name, points):
+        calls.append(len(points))
+        if len(calls) == 1:
+            raise OSError("disk full")
+        append_track(route_name, points)
+
+    monkeypatch.setattr(pilot, "append_track", flaky_append_track)
+
+    for fix in fixes(3):
+        recorder.offer(fix)
+    with pytest.raises(OSError):
+        asyncio.run(recorder.flush())
+    assert len(recorder.buffer) == 3
+
+    recorder.offer(fixes(4)[-1])
+    assert asyncio.run(recorder.flush())
+    assert calls == [3, 4]
+    assert len(recorder.buffer) == 0
+    assert [point["latitude"] for point in track(pilot)] == [45.0, 45.01, 45.02, 45.03]
+
+
+def test_recorder_writes_a_replayed_feed_once(pilot, tmp_path, monkeypatch):
+    nmea_path = tmp_path / "track.nmea"
+    with open(nmea_path, "w") as nmea_file:
+        nmea_file.write("\n".join(lines(fixes(10))) + "\n")
+
+    # slow writes, so that the feed ends while one is in flight
+    append_track = pilot.append_track
+
+    def slow_append_track(route_name, points):
+        time.sleep(0.3)
+        append_track(route_name, points)
+
+    monkeypatch.setattr(pilot, "append_track", slow_append_track)
+
+    recorder = natpi.TrackRecorder(pilot, "Track", cadence=0.05)
+    asyncio.run(recorder.run(natpi.nmea_replay(nmea_path, rate=50)))
+
+    assert recorder.received == 10
+    assert recorder.written == 10
+    assert [point["latitude"] for point in track(pilot)] == pytest.approx(
+        [45.0 + i * 0.01 for i in range(10)]
+    )